@@ -4,11 +4,15 @@
 物流演示系统 - FastAPI 接口服务
 """
 
-from fastapi import FastAPI, HTTPException, Path, Body
+from fastapi import FastAPI, HTTPException, Path, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import sqlite3
+import csv
+import io
+import json
 from datetime import datetime
 import uvicorn
 
@@ -87,6 +91,23 @@ STATUS_MAP = {
     "returned": "已退回"
 }
 
+# 导出相关配置
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8"
+}
+ORDER_EXPORT_COLUMNS = [
+    "order_id", "customer_name", "customer_phone", "pickup_address", "delivery_address",
+    "package_type", "status", "current_location", "estimated_delivery", "scheduled_time",
+    "created_at", "updated_at"
+]
+TRACKING_EXPORT_COLUMNS = ["status", "location", "description", "timestamp"]
+# CSV 订单列：在 status 之后插入 status_text
+CSV_ORDER_COLUMNS = list(ORDER_EXPORT_COLUMNS)
+CSV_ORDER_COLUMNS.insert(CSV_ORDER_COLUMNS.index("status") + 1, "status_text")
+CSV_EXPORT_HEADER = CSV_ORDER_COLUMNS + ["tracking_" + column for column in TRACKING_EXPORT_COLUMNS]
+
 def get_db_connection():
     """获取数据库连接"""
     conn = sqlite3.connect(DB_PATH)
@@ -103,7 +124,8 @@ async def root():
         "endpoints": {
             "查询订单": "GET /api/orders/{order_id}",
             "预约时间": "POST /api/orders/{order_id}/schedule",
-            "按电话查询": "GET /api/orders/by-phone/{phone}"
+            "按电话查询": "GET /api/orders/by-phone/{phone}",
+            "批量导出": "GET /api/export/orders"
         }
     }
 
@@ -312,6 +334,155 @@ async def schedule_delivery(
         }
     }
 
+def open_export_cursor(updated_since=None):
+    """
+    开启只读快照并执行导出查询
+
+    订单与轨迹按 (updated_at, order_id, 轨迹时间) 排序连接，每条轨迹一行，
+    无轨迹的订单以轨迹字段为 None 的一行返回；在返回流式响应前调用，
+    使连接或查询失败能以错误状态码返回
+    """
+    # StreamingResponse 会在线程池的不同线程中推进生成器
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        # 显式开启事务，保证整个导出读到同一快照
+        conn.execute("BEGIN")
+
+        order_columns = ", ".join(f"o.{column}" for column in ORDER_EXPORT_COLUMNS)
+        tracking_columns = ", ".join(
+            f"t.{column} AS tracking_{column}" for column in TRACKING_EXPORT_COLUMNS
+        )
+        sql = f"SELECT {order_columns}, {tracking_columns} FROM orders o LEFT JOIN tracking_history t ON t.order_id = o.order_id"
+        params = ()
+        if updated_since:
+            sql += " WHERE o.updated_at >= ?"
+            params = (updated_since,)
+        sql += " ORDER BY o.updated_at ASC, o.order_id ASC, t.timestamp ASC, t.id ASC"
+
+        cursor = conn.execute(sql, params)
+    except Exception:
+        conn.close()
+        raise
+    return conn, cursor
+
+def iter_export_rows(conn, cursor):
+    """分批 fetchmany 导出结果并逐批产出，结束或中断时关闭连接"""
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.rollback()
+        conn.close()
+
+def build_export_order(row):
+    """根据导出行构建订单记录（不含物流轨迹）"""
+    order = {column: row[column] for column in ORDER_EXPORT_COLUMNS}
+    order["status_text"] = STATUS_MAP.get(row["status"], row["status"])
+    order["tracking_history"] = []
+    return order
+
+def stream_orders_ndjson(conn, cursor):
+    """以 NDJSON 格式逐行输出订单，每行一个订单并内嵌物流轨迹"""
+    current = None
+    for rows in iter_export_rows(conn, cursor):
+        lines = []
+        for row in rows:
+            if current is None or current["order_id"] != row["order_id"]:
+                if current is not None:
+                    lines.append(json.dumps(current, ensure_ascii=False) + "\n")
+                current = build_export_order(row)
+            if row["tracking_timestamp"] is not None:
+                current["tracking_history"].append({
+                    column: row["tracking_" + column]
+                    for column in TRACKING_EXPORT_COLUMNS
+                })
+        if lines:
+            yield "".join(lines)
+    if current is not None:
+        yield json.dumps(current, ensure_ascii=False) + "\n"
+
+def stream_orders_csv(conn, cursor):
+    """以 CSV 格式输出订单，每条物流轨迹一行，订单字段随行重复"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_EXPORT_HEADER)
+    yield buffer.getvalue()
+
+    for rows in iter_export_rows(conn, cursor):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            status_text = STATUS_MAP.get(row["status"], row["status"])
+            values = [
+                status_text if column == "status_text" else row[column]
+                for column in CSV_ORDER_COLUMNS
+            ]
+            values += [row["tracking_" + column] for column in TRACKING_EXPORT_COLUMNS]
+            writer.writerow(values)
+        yield buffer.getvalue()
+
+@app.get("/api/export/orders", tags=["数据导出"])
+def export_orders(
+    export_format: str = Query(
+        "ndjson",
+        alias="format",
+        pattern="^(ndjson|csv)$",
+        description="导出格式: ndjson 或 csv"
+    ),
+    updated_since: Optional[str] = Query(
+        None,
+        description="仅导出 updated_at 不早于该时间的订单 (格式: YYYY-MM-DD HH:MM:SS)，用于增量导出",
+        example="2025-01-03 00:00:00"
+    )
+):
+    """
+    批量导出订单及物流轨迹
+
+    以流式响应分批输出全部订单，内存占用与数据量无关；
+    结果按 updated_at 升序排列，可将最后一条的 updated_at 作为下次增量导出的起点
+    """
+    if updated_since is not None:
+        try:
+            # 规范化为补零格式，与库中 updated_at 的字符串比较保持一致
+            updated_since = datetime.strptime(
+                updated_since, "%Y-%m-%d %H:%M:%S"
+            ).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "success": False,
+                    "error": "时间格式错误，请使用 YYYY-MM-DD HH:MM:SS 格式"
+                }
+            )
+
+    try:
+        conn, cursor = open_export_cursor(updated_since)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "success": False,
+                "error": str(e)
+            }
+        )
+
+    if export_format == "csv":
+        content = stream_orders_csv(conn, cursor)
+    else:
+        content = stream_orders_ndjson(conn, cursor)
+
+    # 同步生成器由 StreamingResponse 放入线程池迭代，不会阻塞其他接口
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=orders.{export_format}"}
+    )
+
 @app.get("/health", tags=["系统"])
 async def health_check():
     """健康检查"""
@@ -337,12 +508,18 @@ async def health_check():
         )
 
 def init_db_if_needed():
-    """如果数据库不存在则初始化"""
+    """如果数据库不存在则初始化，否则补齐数据库设置"""
     if not os.path.exists(DB_PATH):
         print(f"数据库不存在，正在初始化: {DB_PATH}")
         import subprocess
         subprocess.run(["python3", "init_database.py"], check=True)
         print("数据库初始化完成")
+    else:
+        # 已有数据库补齐 WAL 模式与索引
+        from init_database import ensure_database_options
+        conn = sqlite3.connect(DB_PATH)
+        ensure_database_options(conn)
+        conn.close()
 
 if __name__ == "__main__":
     # 启动前检查并初始化数据库
@@ -209,9 +209,24 @@ def init_database():
     )
     ''')
     
+    ensure_database_options(conn)
+    
     conn.commit()
     return conn, cursor
 
+def ensure_database_options(conn):
+    """设置 WAL 模式并创建索引（可重复执行，已有数据库启动时也会调用）"""
+    cursor = conn.cursor()
+    
+    # WAL 模式下长时间的读事务（如批量导出）不会阻塞写入
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
+    # 创建索引（支持按轨迹关联订单及按更新时间增量导出）
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracking_history_order_id ON tracking_history (order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_updated_at ON orders (updated_at)")
+    
+    conn.commit()
+
 def generate_demo_data(cursor, count=35):
     """生成演示数据"""
     print(f"开始生成 {count} 条演示订单数据...")